@@ -12,6 +12,7 @@ import time
 from pathlib import Path
 from openai import OpenAI
 from dotenv import load_dotenv
+from openai_usage_tracker import UsageTracker
 
 # Load environment variables
 load_dotenv()
@@ -29,6 +30,10 @@ FALLBACK_MODEL = "gpt-4o-mini"
 # Input and output paths
 INPUT_FILE = Path("app/src/main/java/com/gita/app/data/enriched_gita_formatted.json")
 OUTPUT_FILE = INPUT_FILE  # Save to same file
+USAGE_LOG_FILE = Path("enrichment_usage.jsonl")
+USAGE_SUMMARY_FILE = Path("enrichment_usage_summary.json")
+
+tracker = UsageTracker(USAGE_LOG_FILE)
 
 # Emotion categories to choose from
 EMOTION_CATEGORIES = [
@@ -60,6 +65,8 @@ Do not include any explanation, just the JSON array."""
 
     try:
         # Try gpt-5-nano first, fallback to gpt-4o-mini if not available
+        used_model = MODEL
+        request_start = time.perf_counter()
         try:
             response = client.chat.completions.create(
                 model=MODEL,
@@ -71,22 +78,35 @@ Do not include any explanation, just the JSON array."""
                 max_tokens=100
             )
         except Exception as e:
+            # The failed primary attempt is its own record
+            tracker.record(MODEL, latency_s=time.perf_counter() - request_start, kind="emotions",
+                           item_id=verse_data.get("id"), error=e)
             if "gpt-5-nano" in str(e).lower() or "model" in str(e).lower():
                 try:
                     print(f"  ⚠️  {MODEL} not available, using {FALLBACK_MODEL}")
                 except:
                     pass
-                response = client.chat.completions.create(
-                    model=FALLBACK_MODEL,
-                    messages=[
-                        {"role": "system", "content": "You are a helpful assistant that analyzes Bhagavad Gita verses and assigns relevant emotions. Always return valid JSON arrays only."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.7,
-                    max_tokens=100
-                )
+                used_model = FALLBACK_MODEL
+                request_start = time.perf_counter()
+                try:
+                    response = client.chat.completions.create(
+                        model=FALLBACK_MODEL,
+                        messages=[
+                            {"role": "system", "content": "You are a helpful assistant that analyzes Bhagavad Gita verses and assigns relevant emotions. Always return valid JSON arrays only."},
+                            {"role": "user", "content": prompt}
+                        ],
+                        temperature=0.7,
+                        max_tokens=100
+                    )
+                except Exception as fallback_error:
+                    tracker.record(FALLBACK_MODEL, latency_s=time.perf_counter() - request_start, kind="emotions",
+                                   item_id=verse_data.get("id"), retries=1, fallback=True, error=fallback_error)
+                    raise
             else:
                 raise
+        tracker.record(used_model, response.usage, time.perf_counter() - request_start, kind="emotions",
+                       item_id=verse_data.get("id"), retries=int(used_model != MODEL),
+                       fallback=used_model != MODEL)
         
         content = response.choices[0].message.content.strip()
         # Remove markdown code blocks if present
@@ -139,6 +159,8 @@ Return ONLY the reflection text, no explanations or formatting."""
 
     try:
         # Try gpt-5-nano first, fallback to gpt-4o-mini if not available
+        used_model = MODEL
+        request_start = time.perf_counter()
         try:
             response = client.chat.completions.create(
                 model=MODEL,
@@ -150,22 +172,35 @@ Return ONLY the reflection text, no explanations or formatting."""
                 max_tokens=200
             )
         except Exception as e:
+            # The failed primary attempt is its own record
+            tracker.record(MODEL, latency_s=time.perf_counter() - request_start, kind="reflection",
+                           item_id=verse_data.get("id"), error=e)
             if "gpt-5-nano" in str(e).lower() or "model" in str(e).lower():
                 try:
                     print(f"  ⚠️  {MODEL} not available, using {FALLBACK_MODEL}")
                 except:
                     pass
-                response = client.chat.completions.create(
-                    model=FALLBACK_MODEL,
-                    messages=[
-                        {"role": "system", "content": "You are a thoughtful reflection writer for Bhagavad Gita verses. Write calm, personal, non-religious reflections of approximately 100 words."},
-                        {"role": "user", "content": prompt}
-                    ],
-                    temperature=0.7,
-                    max_tokens=200
-                )
+                used_model = FALLBACK_MODEL
+                request_start = time.perf_counter()
+                try:
+                    response = client.chat.completions.create(
+                        model=FALLBACK_MODEL,
+                        messages=[
+                            {"role": "system", "content": "You are a thoughtful reflection writer for Bhagavad Gita verses. Write calm, personal, non-religious reflections of approximately 100 words."},
+                            {"role": "user", "content": prompt}
+                        ],
+                        temperature=0.7,
+                        max_tokens=200
+                    )
+                except Exception as fallback_error:
+                    tracker.record(FALLBACK_MODEL, latency_s=time.perf_counter() - request_start, kind="reflection",
+                                   item_id=verse_data.get("id"), retries=1, fallback=True, error=fallback_error)
+                    raise
             else:
                 raise
+        tracker.record(used_model, response.usage, time.perf_counter() - request_start, kind="reflection",
+                       item_id=verse_data.get("id"), retries=int(used_model != MODEL),
+                       fallback=used_model != MODEL)
         
         reflection = response.choices[0].message.content.strip()
         # Remove markdown formatting if present
@@ -273,6 +308,7 @@ def main():
     print(f"\nFound {len(verses_to_process)} verses that need processing")
     
     # Process verses
+    verses_done = 0
     try:
         for idx, verse in verses_to_process:
             verse_id = verse.get("id", f"unknown_{idx}")
@@ -296,6 +332,8 @@ def main():
                 print(f"  Reflection: {reflection[:80]}...")
                 time.sleep(0.5)  # Rate limiting
             
+            verses_done += 1
+            
             # Save progress every 5 verses
             if (idx + 1) % 5 == 0:
                 print(f"\nSaving progress... ({idx+1}/{len(verses)} processed)")
@@ -305,17 +343,20 @@ def main():
         print(f"\nSaving final results...")
         save_verses(verses)
         print(f"\nDone! Processed {len(verses_to_process)} verses")
+        tracker.write_summary(USAGE_SUMMARY_FILE, items_processed=len(verses_to_process))
         
     except KeyboardInterrupt:
         print("\n\nInterrupted by user. Saving progress...")
         save_verses(verses)
         print("Progress saved!")
+        tracker.write_summary(USAGE_SUMMARY_FILE, items_processed=verses_done)
     except Exception as e:
         print(f"\nError during processing: {e}")
         import traceback
         traceback.print_exc()
         print("\nAttempting to save progress...")
         save_verses(verses)
+        tracker.write_summary(USAGE_SUMMARY_FILE, items_processed=verses_done)
 
 if __name__ == "__main__":
     main()
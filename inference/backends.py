@@ -0,0 +1,81 @@
+"""
+Alternative scoring backends for the bi-encoder checkpoints.
+
+Any object with `score_all(query_emb, key_matrix) -> np.ndarray` can be passed to
+`find_best_verse`/`find_best_story` in place of the tinygrad model. The math
+mirrors `TinyBiEncoderModel.kt`: linear query projection, fc1+relu+fc2 keys,
+dot-product score.
+"""
+import pickle
+from pathlib import Path
+
+import numpy as np
+
+QUANTIZE_MODES = (None, "float16", "int8")
+
+
+def load_state_dict(checkpoint_path: Path) -> dict:
+    """Load a pickle checkpoint as float32 numpy arrays."""
+    with open(checkpoint_path, 'rb') as f:
+        state_dict = pickle.load(f)
+    return {name: np.asarray(value, dtype=np.float32)
+            for name, value in state_dict.items() if value is not None}
+
+
+class NumpyBiEncoder:
+    """Pure-numpy bi-encoder with cached key encodings and optional (simulated) key quantization."""
+
+    def __init__(self, state_dict: dict, quantize=None):
+        if quantize not in QUANTIZE_MODES:
+            raise ValueError(f"Unknown quantize mode {quantize!r}, expected one of {QUANTIZE_MODES}")
+        self.quantize = quantize
+        self.query_proj_t = np.ascontiguousarray(state_dict['query_proj.weight'].T)  # (1536, 256)
+        self.key_fc1_t = np.ascontiguousarray(state_dict['key_fc1.weight'].T)        # (1536, 32)
+        self.key_fc1_b = state_dict.get('key_fc1.bias', np.zeros(self.key_fc1_t.shape[1], dtype=np.float32))
+        self.key_fc2_t = np.ascontiguousarray(state_dict['key_fc2.weight'].T)        # (32, 256)
+        self.key_fc2_b = state_dict.get('key_fc2.bias', np.zeros(self.key_fc2_t.shape[1], dtype=np.float32))
+        # id(key_matrix) -> (key_matrix, encoded keys, per-row scales)
+        self._key_cache = {}
+
+    @classmethod
+    def from_checkpoint(cls, checkpoint_path: Path, quantize=None):
+        return cls(load_state_dict(checkpoint_path), quantize=quantize)
+
+    def encode_query(self, queries: np.ndarray) -> np.ndarray:
+        return np.asarray(queries, dtype=np.float32) @ self.query_proj_t
+
+    def encode_key(self, keys: np.ndarray) -> np.ndarray:
+        hidden = np.maximum(np.asarray(keys, dtype=np.float32) @ self.key_fc1_t + self.key_fc1_b, 0.0)
+        return hidden @ self.key_fc2_t + self.key_fc2_b
+
+    def _encoded_keys(self, key_matrix: np.ndarray) -> np.ndarray:
+        """Encode (and quantize) a key matrix once; later calls hit the cache.
+
+        Quantized modes round-trip the keys through float16/int8 and cache the
+        dequantized float32 result: numpy has no fast fp16/int8 matmul, so
+        compute stays float32 and only the precision loss is simulated.
+        """
+        cached = self._key_cache.get(id(key_matrix))
+        if cached is not None and cached[0] is key_matrix:
+            return cached[1]
+
+        encoded = self.encode_key(key_matrix)
+        if self.quantize == "float16":
+            encoded = encoded.astype(np.float16).astype(np.float32)
+        elif self.quantize == "int8":
+            # Symmetric per-row quantization
+            scales = np.abs(encoded).max(axis=1) / 127.0
+            scales[scales == 0] = 1.0
+            quantized = np.round(encoded / scales[:, None]).astype(np.int8)
+            encoded = quantized.astype(np.float32) * scales[:, None].astype(np.float32)
+        encoded = np.ascontiguousarray(encoded, dtype=np.float32)
+        self._key_cache[id(key_matrix)] = (key_matrix, encoded)
+        return encoded
+
+    def score_all(self, query_emb, key_matrix: np.ndarray) -> np.ndarray:
+        """Scores of one query (or a batch of queries) against every key row."""
+        queries = np.asarray(query_emb, dtype=np.float32)
+        single = queries.ndim == 1
+        query_encoded = self.encode_query(queries.reshape(1, -1) if single else queries)
+        scores = query_encoded @ self._encoded_keys(key_matrix).T
+        return scores[0] if single else scores
@@ -0,0 +1,286 @@
+"""
+Offline bulk matching of user phrases against verses and stories.
+
+Streams phrases from a file, embeds them a few chunks ahead of scoring (or
+reads precomputed embeddings), scores them on a process pool that shares the
+encoded key matrices, and writes top-k results as JSONL. A checkpoint next to the output
+records how far the job got, so an interrupted run resumes where it stopped.
+
+Input is either plain text (one phrase per line) or JSONL with
+{"phrase": "...", "embedding": [...]} where "embedding" is optional.
+
+Usage:
+    python inference/batch_match.py phrases.txt results.jsonl
+    python inference/batch_match.py phrases.jsonl results.jsonl --top-k 5 --workers 8
+"""
+import argparse
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+from pathlib import Path
+
+import numpy as np
+
+from backends import NumpyBiEncoder
+
+CHUNK_SIZE = 256  # phrases per worker task
+CHECKPOINT_EVERY = 20  # chunks between checkpoints
+PREFETCH_CHUNKS = 4  # chunks being embedded ahead of scoring, one thread each
+EMBED_ATTEMPTS = 4  # tries per phrase embedding before giving up
+EMBED_BACKOFF_S = 1.0  # first retry delay, doubled on each further attempt
+
+# Worker-side views into shared memory, set by _init_worker
+_worker_arrays = {}
+_worker_shms = []
+
+
+def _to_shared(array: np.ndarray):
+    """Copy an array into a new shared memory block; returns (shm, spec) for workers."""
+    array = np.ascontiguousarray(array, dtype=np.float32)
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=np.float32, buffer=shm.buf)[...] = array
+    return shm, (shm.name, array.shape)
+
+
+def _init_worker(specs: dict):
+    """Attach to the shared query projections and encoded key matrices."""
+    for name, (shm_name, shape) in specs.items():
+        shm = shared_memory.SharedMemory(name=shm_name)
+        _worker_shms.append(shm)  # keep the mapping alive for the worker's lifetime
+        _worker_arrays[name] = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+
+
+def _top_k(scores: np.ndarray, k: int):
+    """Indices of the k highest scores per row, sorted descending."""
+    k = min(k, scores.shape[1])
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    order = np.argsort(-np.take_along_axis(scores, part, axis=1), axis=1)
+    return np.take_along_axis(part, order, axis=1)
+
+
+def _score_chunk(embeddings: np.ndarray, top_k: int):
+    """Worker task: top-k (index, score) per corpus for a block of phrase embeddings."""
+    results = {}
+    for corpus in ('verse', 'story'):
+        queries = embeddings @ _worker_arrays[f'{corpus}_query_proj']
+        scores = queries @ _worker_arrays[f'{corpus}_keys'].T
+        top = _top_k(scores, top_k)
+        results[corpus] = (top, np.take_along_axis(scores, top, axis=1))
+    return results
+
+
+def iter_phrase_chunks(input_path: Path, start_line: int, chunk_size: int):
+    """Yield lists of (line_no, phrase, embedding-or-None), skipping lines before start_line."""
+    is_jsonl = input_path.suffix == '.jsonl'
+    chunk = []
+    with open(input_path, 'r', encoding='utf-8') as f:
+        for line_no, line in enumerate(f):
+            if line_no < start_line:
+                continue
+            line = line.strip()
+            if not line:
+                continue
+            if is_jsonl:
+                entry = json.loads(line)
+                chunk.append((line_no, entry['phrase'], entry.get('embedding')))
+            else:
+                chunk.append((line_no, line, None))
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+    if chunk:
+        yield chunk
+
+
+def embed_phrase(phrase: str, embed_fn):
+    """Embed one phrase with embed_fn, retrying with exponential backoff."""
+    for attempt in range(EMBED_ATTEMPTS):
+        try:
+            return embed_fn(phrase)
+        except Exception as e:
+            if attempt == EMBED_ATTEMPTS - 1:
+                raise
+            delay = EMBED_BACKOFF_S * 2 ** attempt
+            print(f"  ⚠️  Embedding failed ({e}), retrying in {delay:.0f}s...")
+            time.sleep(delay)
+
+
+def embed_chunk(chunk, embed_fn, dimension: int) -> np.ndarray:
+    """Embedding matrix for a chunk, fetching only phrases without a precomputed embedding."""
+    matrix = np.empty((len(chunk), dimension), dtype=np.float32)
+    for i, (line_no, phrase, emb) in enumerate(chunk):
+        if emb is None:
+            if embed_fn is None:
+                raise ValueError("OPENAI_API_KEY not set in environment or .env file")
+            emb = embed_phrase(phrase, embed_fn)
+        if len(emb) != dimension:
+            raise ValueError(f"Line {line_no}: embedding has {len(emb)} values, expected {dimension}")
+        matrix[i] = emb
+    return matrix
+
+
+def load_checkpoint(checkpoint_path: Path, output_path: Path, params: dict):
+    """Return (next_line, output_bytes); truncates output written after the last checkpoint.
+
+    Refuses to resume when the checkpoint was written with different run
+    parameters, or when the output file is shorter than the checkpoint says.
+    A non-empty output without a checkpoint is never overwritten.
+    """
+    checkpoint = {'next_line': 0, 'output_bytes': 0, 'params': params}
+    if checkpoint_path.exists():
+        with open(checkpoint_path, 'r', encoding='utf-8') as f:
+            checkpoint = json.load(f)
+        if checkpoint.get('params') != params:
+            raise ValueError(f"{checkpoint_path} was written with {checkpoint.get('params')}, "
+                             f"not {params}; re-run with the same arguments or pass --restart")
+    elif output_path.exists() and output_path.stat().st_size:
+        raise ValueError(f"{output_path} already exists and there is no checkpoint to resume from; "
+                         f"pass --restart to overwrite it")
+    if output_path.exists():
+        size = output_path.stat().st_size
+        if size < checkpoint['output_bytes']:
+            raise ValueError(f"{output_path} has {size} bytes but the checkpoint expects at least "
+                             f"{checkpoint['output_bytes']}; pass --restart to start over")
+        with open(output_path, 'r+b') as f:
+            f.truncate(checkpoint['output_bytes'])
+    elif checkpoint['output_bytes']:
+        raise ValueError(f"{output_path} is missing but {checkpoint_path} expects "
+                         f"{checkpoint['output_bytes']} bytes; pass --restart to start over")
+    return checkpoint['next_line'], checkpoint['output_bytes']
+
+
+def save_checkpoint(checkpoint_path: Path, next_line: int, output_bytes: int, processed: int, params: dict):
+    tmp_path = checkpoint_path.with_suffix(checkpoint_path.suffix + '.tmp')
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'next_line': next_line, 'output_bytes': output_bytes, 'processed': processed,
+                   'params': params}, f)
+    os.replace(tmp_path, checkpoint_path)
+
+
+def format_results(chunk, scored, verse_ids, story_keys, temperature):
+    """Encoded JSONL lines for one scored chunk."""
+    lines = []
+    for row, (line_no, phrase, _) in enumerate(chunk):
+        record = {'line': line_no, 'phrase': phrase}
+        for field, corpus, ids in (('verses', 'verse', verse_ids), ('stories', 'story', story_keys)):
+            top, scores = scored[corpus]
+            record[field] = [
+                {'id': ids[idx], 'score': float(score), 'scaled_score': float(score / temperature)}
+                for idx, score in zip(top[row], scores[row])
+            ]
+        lines.append((json.dumps(record, ensure_ascii=False) + "\n").encode('utf-8'))
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-match phrases against verses and stories")
+    parser.add_argument('input', type=Path, help="Phrases: plain text (one per line) or JSONL")
+    parser.add_argument('output', type=Path, help="JSONL results file")
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('--restart', action='store_true',
+                        help="Ignore any checkpoint and overwrite the output")
+    args = parser.parse_args()
+
+    # Imported here so pool workers (spawn/forkserver) don't pull in tinygrad
+    import infer
+
+    print("Loading models and embeddings...")
+    verse_embeddings = infer.load_verse_embeddings()
+    story_embeddings = infer.load_story_embeddings()
+    verse_model = NumpyBiEncoder.from_checkpoint(infer.VERSE_MODEL_PATH)
+    story_model = NumpyBiEncoder.from_checkpoint(infer.STORY_MODEL_PATH)
+    # Same helper (and embedding model) as interactive matching
+    embed_fn = infer.get_phrase_embedding if infer.client is not None else None
+    dimension = verse_embeddings.dimension
+
+    # Anything that changes the rows written must match for a resume to be valid
+    params = {
+        'input': str(args.input.resolve()),
+        'top_k': args.top_k,
+        'temperature': infer.TEMPERATURE,
+    }
+    checkpoint_path = args.output.with_suffix(args.output.suffix + '.ckpt')
+    if args.restart:
+        if checkpoint_path.exists():
+            checkpoint_path.unlink()
+        if args.output.exists():
+            args.output.unlink()
+    start_line, output_bytes = load_checkpoint(checkpoint_path, args.output, params)
+    if start_line:
+        print(f"Resuming from input line {start_line} ({output_bytes} bytes of output kept)")
+
+    # Encode keys once in the parent and share them (plus query projections) with workers
+    shms, specs = [], {}
+    for name, array in (
+        ('verse_query_proj', verse_model.query_proj_t),
+        ('verse_keys', verse_model.encode_key(verse_embeddings.matrix)),
+        ('story_query_proj', story_model.query_proj_t),
+        ('story_keys', story_model.encode_key(story_embeddings.matrix)),
+    ):
+        shm, specs[name] = _to_shared(array)
+        shms.append(shm)
+
+    processed = 0
+    next_line = start_line
+    start_time = time.time()
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker, initargs=(specs,)) as pool, \
+                ThreadPoolExecutor(max_workers=PREFETCH_CHUNKS) as fetcher, \
+                open(args.output, 'ab') as out:
+            # Bounded windows of chunks being embedded and scored keep memory flat regardless of input size
+            chunks = iter_phrase_chunks(args.input, start_line, args.chunk_size)
+            fetching = deque()
+            pending = deque()
+            chunks_written = 0
+
+            def fetch_next():
+                chunk = next(chunks, None)
+                if chunk is not None:
+                    fetching.append((chunk, fetcher.submit(embed_chunk, chunk, embed_fn, dimension)))
+
+            def drain_one():
+                nonlocal processed, chunks_written, next_line
+                chunk, future = pending.popleft()
+                lines = format_results(chunk, future.result(), verse_embeddings.ids,
+                                       story_embeddings.ids, infer.TEMPERATURE)
+                out.writelines(lines)
+                processed += len(chunk)
+                chunks_written += 1
+                next_line = chunk[-1][0] + 1
+                if chunks_written % CHECKPOINT_EVERY == 0:
+                    out.flush()
+                    save_checkpoint(checkpoint_path, next_line, out.tell(), processed, params)
+                    rate = processed / max(time.time() - start_time, 1e-9)
+                    print(f"  {processed} phrases matched ({rate:.0f}/s), checkpoint at line {next_line}")
+
+            for _ in range(PREFETCH_CHUNKS):
+                fetch_next()
+            while fetching:
+                chunk, embedding_future = fetching.popleft()
+                embeddings = embedding_future.result()
+                fetch_next()
+                pending.append((chunk, pool.submit(_score_chunk, embeddings, args.top_k)))
+                if len(pending) >= 2 * args.workers:
+                    drain_one()
+            while pending:
+                drain_one()
+
+            out.flush()
+            if chunks_written:
+                save_checkpoint(checkpoint_path, next_line, out.tell(), processed, params)
+    finally:
+        for shm in shms:
+            shm.close()
+            shm.unlink()
+
+    elapsed = time.time() - start_time
+    print(f"\nDone! Matched {processed} phrases in {elapsed:.1f}s -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+Streaming loader for the `{"model", "dimension", "embeddings": {...}}` JSON files.
+Reads `dimension` first, preallocates a float32 matrix and fills it row by row,
+so no per-value Python floats are ever built.
+"""
+import json
+import os
+import re
+from pathlib import Path
+
+import numpy as np
+
+CHUNK_SIZE = 1 << 20  # 1 MiB read chunks
+APPROX_BYTES_PER_VALUE = 20  # "0.006190185900777578, " is ~22 bytes; guess slightly low
+
+_DIMENSION_RE = re.compile(r'"dimension"\s*:\s*(\d+)')
+_MODEL_RE = re.compile(r'"model"\s*:\s*"((?:[^"\\]|\\.)*)"')
+_EMBEDDINGS_RE = re.compile(r'"embeddings"\s*:\s*\{')
+
+
+class EmbeddingTable:
+    """Row-ordered ids plus a (rows, dimension) float32 matrix."""
+
+    def __init__(self, ids, matrix, model=None):
+        if len(ids) != matrix.shape[0]:
+            raise ValueError(f"Got {len(ids)} ids for {matrix.shape[0]} embedding rows")
+        self.ids = list(ids)
+        self.index = {key: row for row, key in enumerate(self.ids)}
+        if len(self.index) != len(self.ids):
+            raise ValueError("Embedding ids must be unique")
+        self.matrix = matrix
+        self.model = model
+
+    @classmethod
+    def from_dict(cls, embeddings: dict, model=None):
+        """Build a table from an `{id: vector}` mapping (e.g. projected story embeddings)."""
+        ids = list(embeddings.keys())
+        if not ids:
+            return cls([], np.zeros((0, 0), dtype=np.float32), model=model)
+        dim = len(embeddings[ids[0]])
+        matrix = np.empty((len(ids), dim), dtype=np.float32)
+        for row, key in enumerate(ids):
+            vec = np.asarray(embeddings[key], dtype=np.float32)
+            if vec.shape != (dim,):
+                raise ValueError(f"Embedding '{key}' has shape {vec.shape}, expected ({dim},)")
+            matrix[row] = vec
+        return cls(ids, matrix, model=model)
+
+    @property
+    def dimension(self) -> int:
+        return self.matrix.shape[1]
+
+    def to_dict(self) -> dict:
+        """`{id: row}` view; rows share memory with the matrix."""
+        return dict(zip(self.ids, self.matrix))
+
+    def keys(self):
+        return list(self.ids)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, key):
+        return key in self.index
+
+
+class _ChunkReader:
+    """Text buffer over a file that refills on demand."""
+
+    def __init__(self, f):
+        self.f = f
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def fill(self) -> bool:
+        """Append the next chunk, dropping consumed text. Returns False at EOF."""
+        if self.eof:
+            return False
+        chunk = self.f.read(CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def skip_separators(self):
+        """Skip whitespace and commas between entries."""
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n,":
+                self.pos += 1
+            if self.pos < len(self.buf) or not self.fill():
+                return
+
+    def peek(self) -> str:
+        if self.pos >= len(self.buf) and not self.fill():
+            raise ValueError("Unexpected end of embeddings file")
+        return self.buf[self.pos]
+
+    def find(self, target: str, start: int) -> int:
+        """Index of `target` at or after buffer offset `start`, reading more as needed."""
+        while True:
+            idx = self.buf.find(target, start)
+            if idx != -1:
+                return idx
+            # fill() drops the consumed prefix, so shift the search offset with it
+            start = len(self.buf) - self.pos
+            if not self.fill():
+                raise ValueError(f"Unexpected end of embeddings file (looking for {target!r})")
+
+    def read_string(self) -> str:
+        """Read a JSON string literal starting at the current position."""
+        if self.peek() != '"':
+            raise ValueError(f"Expected '\"' in embeddings object, got {self.buf[self.pos]!r}")
+        end = self.pos + 1
+        while True:
+            end = self.find('"', end)
+            # Count preceding backslashes to tell escaped quotes apart
+            backslashes = 0
+            while self.buf[end - 1 - backslashes] == "\\":
+                backslashes += 1
+            if backslashes % 2 == 0:
+                break
+            end += 1
+        literal = self.buf[self.pos:end + 1]
+        self.pos = end + 1
+        return json.loads(literal)
+
+    def expect(self, char: str):
+        self.skip_whitespace()
+        if self.peek() != char:
+            raise ValueError(f"Expected {char!r} in embeddings file, got {self.buf[self.pos]!r}")
+        self.pos += 1
+
+    def skip_whitespace(self):
+        while True:
+            while self.pos < len(self.buf) and self.buf[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buf) or not self.fill():
+                return
+
+    def read_array_body(self) -> str:
+        """Text between the current '[' and its matching ']' (arrays are flat)."""
+        self.expect("[")
+        end = self.find("]", self.pos)
+        body = self.buf[self.pos:end]
+        self.pos = end + 1
+        return body
+
+
+def _read_header(reader: _ChunkReader):
+    """Consume up to the opening '{' of `embeddings`; return (model, dimension)."""
+    while True:
+        match = _EMBEDDINGS_RE.search(reader.buf)
+        if match:
+            header = reader.buf[:match.start()]
+            reader.pos = match.end()
+            break
+        if not reader.fill():
+            raise ValueError("Embeddings file has no 'embeddings' object")
+    return _parse_metadata(header)
+
+
+def _parse_metadata(text: str):
+    """(model, dimension) from the top-level text around the `embeddings` object."""
+    dim_match = _DIMENSION_RE.search(text)
+    model_match = _MODEL_RE.search(text)
+    dimension = int(dim_match.group(1)) if dim_match else None
+    model = json.loads(f'"{model_match.group(1)}"') if model_match else None
+    return model, dimension
+
+
+def _read_trailer(reader: _ChunkReader) -> str:
+    """Everything after the `embeddings` object (top-level keys written after it)."""
+    while reader.fill():
+        pass
+    return reader.buf[reader.pos:]
+
+
+def load_embedding_table(path, expected_dimension=None) -> EmbeddingTable:
+    """
+    Stream an embeddings JSON file into an EmbeddingTable.
+
+    Rows are parsed straight into a preallocated float32 matrix, so peak memory
+    stays close to the final array size. Raises ValueError on any row whose
+    length does not match the file's `dimension` (before or after the
+    `embeddings` object). Repeated ids keep the last row, like json.load.
+    """
+    path = Path(path)
+    file_size = os.path.getsize(path)
+
+    with open(path, "r", encoding="utf-8") as f:
+        reader = _ChunkReader(f)
+        reader.fill()
+        model, dimension = _read_header(reader)
+        if dimension is None:
+            dimension = expected_dimension
+        elif expected_dimension is not None and dimension != expected_dimension:
+            raise ValueError(f"{path.name}: dimension {dimension}, expected {expected_dimension}")
+
+        ids = []
+        rows_by_id = {}
+        matrix = None
+        while True:
+            reader.skip_separators()
+            if reader.peek() == "}":
+                reader.pos += 1
+                break
+            key = reader.read_string()
+            reader.expect(":")
+            row = np.fromstring(reader.read_array_body(), dtype=np.float32, sep=",")
+
+            if dimension is None:
+                # Older files without a header: trust the first row
+                dimension = row.shape[0]
+            if row.shape[0] != dimension:
+                raise ValueError(f"{path.name}: embedding '{key}' has {row.shape[0]} values, expected {dimension}")
+
+            if key in rows_by_id:
+                # Same as json.load: the last value wins, the first position is kept
+                matrix[rows_by_id[key]] = row
+                continue
+
+            if matrix is None:
+                capacity = max(1, file_size // (dimension * APPROX_BYTES_PER_VALUE))
+                matrix = np.empty((capacity, dimension), dtype=np.float32)
+            elif len(ids) == matrix.shape[0]:
+                # Estimate was low; grow geometrically
+                matrix.resize((matrix.shape[0] * 2, dimension), refcheck=False)
+            matrix[len(ids)] = row
+            rows_by_id[key] = len(ids)
+            ids.append(key)
+
+        # `model`/`dimension` may also be written after the embeddings object
+        trailer_model, trailer_dimension = _parse_metadata(_read_trailer(reader))
+        if trailer_dimension is not None and dimension is not None and trailer_dimension != dimension:
+            raise ValueError(f"{path.name}: dimension {trailer_dimension} does not match "
+                             f"embedding rows of length {dimension}")
+        if trailer_dimension is not None and expected_dimension is not None and trailer_dimension != expected_dimension:
+            raise ValueError(f"{path.name}: dimension {trailer_dimension}, expected {expected_dimension}")
+        dimension = dimension if dimension is not None else trailer_dimension
+        model = model if model is not None else trailer_model
+
+    if matrix is None:
+        matrix = np.zeros((0, dimension or 0), dtype=np.float32)
+    elif matrix.shape[0] != len(ids):
+        # Trim the unused tail in place instead of copying
+        matrix.resize((len(ids), dimension), refcheck=False)
+    return EmbeddingTable(ids, matrix, model=model)
@@ -0,0 +1,241 @@
+"""
+Retrieval quality-vs-speed evaluation for verse and story matching.
+
+Runs a labeled set of phrases through find_best_verse/find_best_story for each
+backend configuration and reports recall@k, MRR and latency as a Pareto table.
+Phrase embeddings come from a local cache so runs are fully offline.
+
+Labeled set (JSON list or JSONL), one entry per phrase:
+    {"phrase": "...", "verse_ids": ["2.47"], "story_keys": ["Arjuna_Shiva"]}
+
+Usage:
+    python inference/evaluate.py labeled.jsonl
+    python inference/evaluate.py labeled.jsonl --fetch-missing   # fill the cache via OpenAI
+    python inference/evaluate.py labeled.jsonl --configs configs.json --output report.json
+"""
+import argparse
+import json
+import time
+from pathlib import Path
+
+import numpy as np
+
+from infer import (
+    VERSE_MODEL_PATH, STORY_MODEL_PATH, INFERENCE_DIR, TEMPERATURE, TOP_K,
+    VerseModel, StoryModel, load_model, load_verse_embeddings, load_story_embeddings,
+    find_best_verse, find_best_story, get_phrase_embedding, score_all_keys,
+)
+from backends import NumpyBiEncoder
+from jit_backend import TinyJitBiEncoder
+
+PHRASE_CACHE_PATH = INFERENCE_DIR / "phrase_embeddings_cache.json"
+RECALL_KS = (1, 3, 5, 10)
+
+# Each config picks a backend ("tinygrad", "tinygrad-jit" or "numpy"), an optional
+# (simulated, quality-only) key quantization mode for the numpy backend, and the
+# TOP_K used for the timed call.
+# "temperature" is accepted too, but it only rescales scores and never changes
+# the ranking, so it is not varied here.
+DEFAULT_CONFIGS = [
+    {"name": "tinygrad", "backend": "tinygrad"},
+    {"name": "tinygrad-jit", "backend": "tinygrad-jit"},
+    {"name": "numpy-fp32", "backend": "numpy"},
+    {"name": "numpy-fp32-top5", "backend": "numpy", "top_k": 5},
+    {"name": "numpy-fp16", "backend": "numpy", "quantize": "float16"},
+    {"name": "numpy-int8", "backend": "numpy", "quantize": "int8"},
+]
+
+
+def load_labeled_set(path: Path):
+    """Load labeled phrases from a JSON list or a JSONL file."""
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    stripped = text.lstrip()
+    if stripped.startswith('['):
+        entries = json.loads(stripped)
+    else:
+        entries = [json.loads(line) for line in text.splitlines() if line.strip()]
+    for entry in entries:
+        if 'phrase' not in entry:
+            raise ValueError(f"Labeled entry without 'phrase': {entry}")
+        entry.setdefault('verse_ids', [])
+        entry.setdefault('story_keys', [])
+    return entries
+
+
+def load_phrase_cache(path: Path) -> dict:
+    if not path.exists():
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def ensure_phrase_embeddings(phrases, cache_path: Path, fetch_missing: bool) -> dict:
+    """Return {phrase: embedding} for every phrase, fetching and caching missing ones if allowed."""
+    cache = load_phrase_cache(cache_path)
+    missing = [p for p in phrases if p not in cache]
+    if missing and not fetch_missing:
+        raise ValueError(f"{len(missing)} phrases have no cached embedding in {cache_path} "
+                         f"(re-run with --fetch-missing), e.g. {missing[0]!r}")
+    if missing:
+        print(f"Fetching {len(missing)} missing phrase embeddings from OpenAI...")
+        for phrase in missing:
+            cache[phrase] = list(map(float, get_phrase_embedding(phrase)))
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f)
+        print(f"  Saved phrase cache to {cache_path}")
+    return {p: np.asarray(cache[p], dtype=np.float32) for p in phrases}
+
+
+def build_backend(config: dict, checkpoint_path: Path, model_class):
+    """Instantiate the model/backend described by a config."""
+    backend = config.get('backend', 'tinygrad')
+    if backend == 'tinygrad':
+        return load_model(checkpoint_path, model_class)
+    if backend == 'tinygrad-jit':
+        return TinyJitBiEncoder(load_model(checkpoint_path, model_class))
+    if backend == 'numpy':
+        return NumpyBiEncoder.from_checkpoint(checkpoint_path, quantize=config.get('quantize'))
+    raise ValueError(f"Unknown backend {backend!r} in config {config.get('name')}")
+
+
+def evaluate_corpus(find_fn, model, embeddings, id_field, entries, label_field, phrase_embs, temperature, top_k):
+    """Time find_fn at the config's top_k; rank every key (untimed) for recall@k and MRR."""
+    # Minimal record dicts keep the evaluation independent of verse/story text files
+    records = {key: {id_field: key} for key in embeddings.ids}
+    labeled = [e for e in entries if e[label_field]]
+    if not labeled:
+        return None
+
+    # Warm up (first call pays for any lazy compilation / caching)
+    if hasattr(model, 'warmup'):
+        model.warmup(embeddings.matrix, embeddings.dimension)
+    find_fn(labeled[0]['phrase'], model, embeddings, records, temperature=temperature,
+            top_k=top_k, phrase_emb=phrase_embs[labeled[0]['phrase']])
+
+    hits = {k: 0 for k in RECALL_KS}
+    reciprocal_ranks = []
+    latencies = []
+    for entry in labeled:
+        phrase_emb = phrase_embs[entry['phrase']]
+        # Timed: the production call path at the configured TOP_K
+        start = time.perf_counter()
+        find_fn(entry['phrase'], model, embeddings, records, temperature=temperature,
+                top_k=top_k, phrase_emb=phrase_emb)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+
+        # Untimed: full ranking straight from the backend's scores
+        order = np.argsort(-score_all_keys(model, phrase_emb, embeddings), kind='stable')
+        expected = {embeddings.index[key] for key in entry[label_field] if key in embeddings.index}
+        rank = next((i for i, idx in enumerate(order, 1) if idx in expected), None)
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+        for k in RECALL_KS:
+            if rank is not None and rank <= k:
+                hits[k] += 1
+
+    latencies = np.array(latencies)
+    return {
+        'queries': len(labeled),
+        'recall': {k: hits[k] / len(labeled) for k in RECALL_KS},
+        'mrr': float(np.mean(reciprocal_ranks)),
+        'latency_ms_mean': float(latencies.mean()),
+        'latency_ms_p50': float(np.percentile(latencies, 50)),
+        'latency_ms_p95': float(np.percentile(latencies, 95)),
+    }
+
+
+def mark_pareto(rows):
+    """Flag rows not dominated on (higher MRR, lower p50 latency) within each corpus.
+
+    Quality-only rows (simulated quantization) have no meaningful latency and
+    take no part in the comparison.
+    """
+    timed = [row for row in rows if not row['quality_only']]
+    for row in rows:
+        row['pareto'] = not row['quality_only'] and not any(
+            other is not row and other['corpus'] == row['corpus']
+            and other['mrr'] >= row['mrr'] and other['latency_ms_p50'] <= row['latency_ms_p50']
+            and (other['mrr'] > row['mrr'] or other['latency_ms_p50'] < row['latency_ms_p50'])
+            for other in timed
+        )
+    return rows
+
+
+def print_table(rows):
+    recall_headers = " ".join(f"R@{k:<4}" for k in RECALL_KS)
+    header = f"{'config':<16} {'corpus':<7} {'top_k':>5} {recall_headers} {'MRR':<6} {'p50 ms':>8} {'p95 ms':>8}  pareto"
+    print(header)
+    print("-" * len(header))
+    for row in sorted(rows, key=lambda r: (r['corpus'], r['quality_only'], r['latency_ms_p50'] or 0.0)):
+        recalls = " ".join(f"{row['recall'][k]:<6.3f}" for k in RECALL_KS)
+        if row['quality_only']:
+            latency = f"{'-':>8} {'-':>8}  quality only"
+        else:
+            latency = f"{row['latency_ms_p50']:>8.3f} {row['latency_ms_p95']:>8.3f}  {'*' if row['pareto'] else ''}"
+        print(f"{row['config']:<16} {row['corpus']:<7} {row['top_k']:>5} {recalls} {row['mrr']:<6.3f} {latency}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Evaluate retrieval quality vs. speed across backends")
+    parser.add_argument('labeled_set', type=Path, help="JSON/JSONL file of labeled phrases")
+    parser.add_argument('--configs', type=Path, help="JSON list of backend configs (default: built-in set)")
+    parser.add_argument('--phrase-cache', type=Path, default=PHRASE_CACHE_PATH,
+                        help="JSON cache of phrase embeddings")
+    parser.add_argument('--fetch-missing', action='store_true',
+                        help="Fetch uncached phrase embeddings from OpenAI")
+    parser.add_argument('--output', type=Path, help="Write the full report as JSON")
+    args = parser.parse_args()
+
+    entries = load_labeled_set(args.labeled_set)
+    configs = DEFAULT_CONFIGS
+    if args.configs:
+        with open(args.configs, 'r', encoding='utf-8') as f:
+            configs = json.load(f)
+    print(f"Loaded {len(entries)} labeled phrases and {len(configs)} configs")
+
+    phrase_embs = ensure_phrase_embeddings([e['phrase'] for e in entries], args.phrase_cache, args.fetch_missing)
+
+    print("Loading embeddings...")
+    verse_embeddings = load_verse_embeddings()
+    story_embeddings = load_story_embeddings()
+
+    rows = []
+    for config in configs:
+        name = config.get('name', config.get('backend', 'tinygrad'))
+        temperature = config.get('temperature', TEMPERATURE)
+        top_k = config.get('top_k', TOP_K)
+        print(f"Evaluating {name}...")
+        corpora = (
+            ('verse', find_best_verse, VERSE_MODEL_PATH, VerseModel, verse_embeddings, 'id', 'verse_ids'),
+            ('story', find_best_story, STORY_MODEL_PATH, StoryModel, story_embeddings, 'key', 'story_keys'),
+        )
+        for corpus, find_fn, checkpoint, model_class, embeddings, id_field, label_field in corpora:
+            model = build_backend(config, checkpoint, model_class)
+            metrics = evaluate_corpus(find_fn, model, embeddings, id_field, entries, label_field,
+                                      phrase_embs, temperature, top_k)
+            if metrics is not None:
+                row = {'config': name, 'corpus': corpus, 'top_k': top_k, **metrics}
+                # Quantization is simulated in float32 (see NumpyBiEncoder), so its timings
+                # say nothing about real quantized kernels
+                row['quality_only'] = bool(config.get('quantize'))
+                if row['quality_only']:
+                    for key in ('latency_ms_mean', 'latency_ms_p50', 'latency_ms_p95'):
+                        row[key] = None
+                rows.append(row)
+
+    if not rows:
+        print("No labeled verse ids or story keys to evaluate.")
+        return
+
+    mark_pareto(rows)
+    print()
+    print_table(rows)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({'configs': configs, 'results': rows}, f, indent=2)
+        print(f"\nWrote report to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,10 @@ import json
 import numpy as np
 from pathlib import Path
 import sys
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from dotenv import load_dotenv
 import os
 
@@ -17,19 +21,30 @@ from query_key.bi_encoder_verse import KeyQueryModel as VerseModel
 from query_key.bi_encoder_story import KeyQueryModel as StoryModel
 from query_key.utils import get_phrase_embedding, project_story_embeddings
 from openai import OpenAI
+from embedding_store import EmbeddingTable, load_embedding_table
+from jit_backend import TinyJitBiEncoder, TINYGRAD_LOCK
+from backends import NumpyBiEncoder
 
 # Load environment variables
 load_dotenv()
 
-# Initialize OpenAI client
+# Initialize OpenAI client (checked in main() so offline tools can import this module)
 API_KEY = os.getenv('OPENAI_API_KEY')
-if not API_KEY:
-    raise ValueError("OPENAI_API_KEY not set in environment or .env file")
-client = OpenAI(api_key=API_KEY)
+client = OpenAI(api_key=API_KEY) if API_KEY else None
 
 # Inference hyperparameters
 TEMPERATURE = 1.0  # Higher temperature for softer, less confident predictions (training uses 0.07)
 TOP_K = 1  # Number of top results to return
+# Interactive scoring backend: "tinygrad-jit" (TinyJit graphs, warmed up at startup),
+# "tinygrad" (eager) or "numpy" (opt-in; scores verse and story truly in parallel
+# since BLAS releases the GIL, while both tinygrad paths share TINYGRAD_LOCK)
+BACKEND = "tinygrad-jit"
+CORPUS_DEADLINE_S = 5.0  # Per-corpus time budget in concurrent matching; late corpora are reported as missing
+
+# model -> lock held while a query is being scored on it, so a task left running
+# past its deadline delays (never skips) the next query for that model
+_model_locks = weakref.WeakKeyDictionary()
+_model_locks_guard = threading.Lock()
 
 # Paths relative to inference folder
 INFERENCE_DIR = Path(__file__).parent
@@ -63,20 +78,29 @@ def load_model(checkpoint_path: Path, model_class):
     return model
 
 
+def load_backend(checkpoint_path: Path, model_class, backend=None):
+    """Load a checkpoint for the configured scoring BACKEND."""
+    backend = backend or BACKEND
+    if backend == "numpy":
+        return NumpyBiEncoder.from_checkpoint(checkpoint_path)
+    if backend == "tinygrad-jit":
+        return TinyJitBiEncoder(load_model(checkpoint_path, model_class))
+    if backend == "tinygrad":
+        return load_model(checkpoint_path, model_class)
+    raise ValueError(f"Unknown BACKEND {backend!r}")
+
+
 def load_verse_embeddings():
-    """Load verse embeddings (1536-dim)."""
-    with open(VERSE_EMBEDDINGS_PATH, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    return data.get('embeddings', {})
+    """Load verse embeddings (1536-dim) as an EmbeddingTable."""
+    return load_embedding_table(VERSE_EMBEDDINGS_PATH, expected_dimension=1536)
 
 
 def load_story_embeddings():
     """Load story embeddings (3072-dim) and project to 1536-dim."""
-    with open(STORY_EMBEDDINGS_PATH, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    story_embeddings_3072 = data.get('embeddings', {})
-    # Project to 1536-dim
-    return project_story_embeddings(story_embeddings_3072)
+    story_table_3072 = load_embedding_table(STORY_EMBEDDINGS_PATH, expected_dimension=3072)
+    # Project to 1536-dim (rows are views into the streamed matrix, no float lists)
+    projected = project_story_embeddings(story_table_3072.to_dict())
+    return EmbeddingTable.from_dict(projected, model=story_table_3072.model)
 
 
 def load_verses():
@@ -97,24 +121,38 @@ def load_stories():
     return {story['key']: story for story in stories}
 
 
-def find_best_verse(phrase: str, verse_model, verse_embeddings, verses_dict, temperature=TEMPERATURE, top_k=TOP_K):
+def score_all_keys(model, phrase_emb, embeddings):
+    """Raw scores of one phrase embedding against every row of an EmbeddingTable.
+
+    `model` is either the tinygrad KeyQueryModel or a backend exposing
+    `score_all(query_emb, key_matrix)` (see backends.py).
+    """
+    if hasattr(model, 'score_all'):
+        return np.asarray(model.score_all(phrase_emb, embeddings.matrix), dtype=np.float32).flatten()
+
+    with TINYGRAD_LOCK:
+        # Encode query
+        query_tensor = Tensor(np.array([phrase_emb], dtype=np.float32))
+        query_encoded = model.encode_query(query_tensor)
+
+        # Batch encode all keys (matrix is already float32, no per-query copy)
+        keys_tensor = Tensor(embeddings.matrix)
+        keys_encoded = model.encode_key(keys_tensor)
+
+        # Compute similarity scores for all keys at once
+        scores = model.score(query_encoded, keys_encoded)
+        return scores.numpy().flatten()
+
+
+def find_best_verse(phrase: str, verse_model, verse_embeddings, verses_dict, temperature=TEMPERATURE, top_k=TOP_K, phrase_emb=None):
     """Find the best matching verse(s) for a phrase using temperature scaling."""
-    # Get phrase embedding
-    phrase_emb = get_phrase_embedding(phrase)
-    
-    # Encode query
-    query_tensor = Tensor(np.array([phrase_emb], dtype=np.float32))
-    query_encoded = verse_model.encode_query(query_tensor)
-    
-    # Batch encode all verse keys
-    verse_ids = list(verse_embeddings.keys())
-    verse_embs_array = np.array([verse_embeddings[vid] for vid in verse_ids], dtype=np.float32)
-    keys_tensor = Tensor(verse_embs_array)
-    keys_encoded = verse_model.encode_key(keys_tensor)
+    # Get phrase embedding (callers with a cached embedding skip the API call)
+    if phrase_emb is None:
+        phrase_emb = get_phrase_embedding(phrase)
     
-    # Compute similarity scores for all verses at once
-    scores = verse_model.score(query_encoded, keys_encoded)
-    scores_array = scores.numpy().flatten()
+    # Score all verses at once
+    verse_ids = verse_embeddings.ids
+    scores_array = score_all_keys(verse_model, phrase_emb, verse_embeddings)
     
     # Apply temperature scaling
     scaled_scores = scores_array / temperature
@@ -133,24 +171,15 @@ def find_best_verse(phrase: str, verse_model, verse_embeddings, verses_dict, tem
     return results
 
 
-def find_best_story(phrase: str, story_model, story_embeddings, stories_dict, temperature=TEMPERATURE, top_k=TOP_K):
+def find_best_story(phrase: str, story_model, story_embeddings, stories_dict, temperature=TEMPERATURE, top_k=TOP_K, phrase_emb=None):
     """Find the best matching story(ies) for a phrase using temperature scaling."""
-    # Get phrase embedding
-    phrase_emb = get_phrase_embedding(phrase)
-    
-    # Encode query
-    query_tensor = Tensor(np.array([phrase_emb], dtype=np.float32))
-    query_encoded = story_model.encode_query(query_tensor)
-    
-    # Batch encode all story keys
-    story_keys = list(story_embeddings.keys())
-    story_embs_array = np.array([story_embeddings[sk] for sk in story_keys], dtype=np.float32)
-    keys_tensor = Tensor(story_embs_array)
-    keys_encoded = story_model.encode_key(keys_tensor)
+    # Get phrase embedding (callers with a cached embedding skip the API call)
+    if phrase_emb is None:
+        phrase_emb = get_phrase_embedding(phrase)
     
-    # Compute similarity scores for all stories at once
-    scores = story_model.score(query_encoded, keys_encoded)
-    scores_array = scores.numpy().flatten()
+    # Score all stories at once
+    story_keys = story_embeddings.ids
+    scores_array = score_all_keys(story_model, phrase_emb, story_embeddings)
     
     # Apply temperature scaling
     scaled_scores = scores_array / temperature
@@ -169,15 +198,135 @@ def find_best_story(phrase: str, story_model, story_embeddings, stories_dict, te
     return results
 
 
+def _model_lock(model) -> threading.Lock:
+    with _model_locks_guard:
+        lock = _model_locks.get(model)
+        if lock is None:
+            lock = _model_locks[model] = threading.Lock()
+        return lock
+
+
+def _find_exclusive(find_fn, model, deadline, *args, **kwargs):
+    """Run find_fn once `model` is free, waiting at most until `deadline` (monotonic)."""
+    lock = _model_lock(model)
+    timeout = -1 if deadline is None else max(deadline - time.monotonic(), 0.0)
+    if not lock.acquire(timeout=timeout):
+        raise TimeoutError("previous query on this model is still running")
+    try:
+        return find_fn(*args, **kwargs)
+    finally:
+        lock.release()
+
+
+def iter_matches(phrase: str, corpora: dict, temperature=TEMPERATURE, top_k=TOP_K,
+                 deadline_s=CORPUS_DEADLINE_S, executor=None, phrase_emb=None):
+    """Score every corpus concurrently and yield (name, results) as each one finishes.
+
+    `corpora` maps a name to `(find_fn, model, embeddings, records_dict)`, e.g.
+    `{"verse": (find_best_verse, verse_model, verse_embeddings, verses_dict)}`.
+    The phrase embedding is fetched once and shared. `deadline_s` is either one
+    number or a `{name: seconds}` dict. A corpus is yielded as `(name, None)`
+    when it misses its deadline or raises. A task still running from an earlier
+    call delays the same model's next query, within that query's own deadline.
+    Pass an executor with room for those late tasks (e.g. 2 workers per corpus).
+    """
+    if not corpora:
+        return
+    if phrase_emb is None:
+        phrase_emb = get_phrase_embedding(phrase)
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=2 * len(corpora))
+    try:
+        start = time.monotonic()
+        pending = {}
+        for name, (find_fn, model, embeddings, records) in corpora.items():
+            budget = deadline_s.get(name) if isinstance(deadline_s, dict) else deadline_s
+            deadline = None if budget is None else start + budget
+            future = executor.submit(_find_exclusive, find_fn, model, deadline,
+                                     phrase, model, embeddings, records,
+                                     temperature=temperature, top_k=top_k, phrase_emb=phrase_emb)
+            pending[future] = (name, deadline)
+
+        while pending:
+            deadlines = [d for _, d in pending.values() if d is not None]
+            timeout = max(min(deadlines) - time.monotonic(), 0.0) if deadlines else None
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, _ = pending.pop(future)
+                try:
+                    results = future.result()
+                except Exception as e:
+                    # One failing corpus must not drop the others
+                    print(f"\n⚠️  {name} matching failed: {e}")
+                    results = None
+                yield name, results
+
+            now = time.monotonic()
+            for future, (name, deadline) in list(pending.items()):
+                if deadline is not None and now >= deadline:
+                    del pending[future]
+                    future.cancel()
+                    print(f"\n⏱️  {name} matching exceeded its {deadline - start:.1f}s deadline, skipped")
+                    yield name, None
+    finally:
+        if own_executor:
+            executor.shutdown(wait=False)
+
+
+def match_concurrently(phrase: str, corpora: dict, on_result=None, **kwargs):
+    """Run iter_matches, calling `on_result(name, results)` as each corpus finishes.
+
+    Returns `{name: results}`, with `None` for corpora that timed out or failed.
+    """
+    all_results = {}
+    for name, results in iter_matches(phrase, corpora, **kwargs):
+        all_results[name] = results
+        if on_result is not None:
+            on_result(name, results)
+    return all_results
+
+
+def print_verse_results(verse_results):
+    """Print verse matches in the interactive format."""
+    if verse_results:
+        for i, (verse, score, scaled_score) in enumerate(verse_results, 1):
+            print(f"\n📖 MATCHING VERSE #{i} (Score: {score:.4f}, Scaled: {scaled_score:.4f})")
+            print(f"   ID: {verse['id']}")
+            print(f"   Translation: {verse.get('translation', 'N/A')}")
+            print(f"   Sanskrit: {verse.get('sanskrit', 'N/A')}")
+            print(f"   Context: {verse.get('context', 'N/A')}")
+            if verse.get('explanation'):
+                print(f"   Explanation: {verse['explanation']}")
+    else:
+        print("\n❌ No verse found")
+
+
+def print_story_results(story_results):
+    """Print story matches in the interactive format."""
+    if story_results:
+        for i, (story, score, scaled_score) in enumerate(story_results, 1):
+            print(f"\n📚 MATCHING STORY #{i} (Score: {score:.4f}, Scaled: {scaled_score:.4f})")
+            print(f"   Key: {story['key']}")
+            print(f"   Title: {story.get('title', 'N/A')}")
+            print(f"   Text: {story.get('text', 'N/A')}")
+    else:
+        print("\n❌ No story found")
+
+
 def main():
     """Main inference function."""
+    if not API_KEY:
+        raise ValueError("OPENAI_API_KEY not set in environment or .env file")
+
     print("Loading models and data...")
     
     # Load models
-    print("  Loading verse model...")
-    verse_model = load_model(VERSE_MODEL_PATH, VerseModel)
-    print("  Loading story model...")
-    story_model = load_model(STORY_MODEL_PATH, StoryModel)
+    print(f"  Loading verse model ({BACKEND})...")
+    verse_model = load_backend(VERSE_MODEL_PATH, VerseModel)
+    print(f"  Loading story model ({BACKEND})...")
+    story_model = load_backend(STORY_MODEL_PATH, StoryModel)
     
     # Load embeddings
     print("  Loading verse embeddings...")
@@ -188,12 +337,25 @@ def main():
     story_embeddings = load_story_embeddings()
     print(f"    Loaded {len(story_embeddings)} story embeddings (projected to 1536-dim)")
     
+    if hasattr(verse_model, 'warmup'):
+        print("  Compiling scoring graphs (TinyJit warm-up)...")
+        verse_model.warmup(verse_embeddings.matrix, verse_embeddings.dimension)
+        story_model.warmup(story_embeddings.matrix, story_embeddings.dimension)
+    
     # Load verse/story text data
     print("  Loading verses and stories...")
     verses_dict = load_verses()
     stories_dict = load_stories()
     print(f"    Loaded {len(verses_dict)} verses and {len(stories_dict)} stories")
     
+    corpora = {
+        'verse': (find_best_verse, verse_model, verse_embeddings, verses_dict),
+        'story': (find_best_story, story_model, story_embeddings, stories_dict),
+    }
+    printers = {'verse': print_verse_results, 'story': print_story_results}
+    # Spare workers let a new query start while a late task from the last one finishes
+    executor = ThreadPoolExecutor(max_workers=2 * len(corpora))
+    
     print("\n✓ All models and data loaded!\n")
     
     # Interactive loop
@@ -216,41 +378,21 @@ def main():
         
         print(f"\nProcessing: '{phrase}'...")
         print("Getting embedding from OpenAI...")
+        phrase_emb = get_phrase_embedding(phrase)
         
-        # Find best verse
-        print("Finding best matching verse...")
-        verse_results = find_best_verse(phrase, verse_model, verse_embeddings, verses_dict, temperature=TEMPERATURE, top_k=TOP_K)
-        
-        # Find best story
-        print("Finding best matching story...")
-        story_results = find_best_story(phrase, story_model, story_embeddings, stories_dict, temperature=TEMPERATURE, top_k=TOP_K)
-        
-        # Display results
+        # Score verses and stories concurrently; print each as soon as it is ready
         print("\n" + "=" * 60)
         print("RESULTS")
         print(f"(Temperature: {TEMPERATURE})")
         print("=" * 60)
         
-        if verse_results:
-            for i, (verse, score, scaled_score) in enumerate(verse_results, 1):
-                print(f"\n📖 MATCHING VERSE #{i} (Score: {score:.4f}, Scaled: {scaled_score:.4f})")
-                print(f"   ID: {verse['id']}")
-                print(f"   Translation: {verse.get('translation', 'N/A')}")
-                print(f"   Sanskrit: {verse.get('sanskrit', 'N/A')}")
-                print(f"   Context: {verse.get('context', 'N/A')}")
-                if verse.get('explanation'):
-                    print(f"   Explanation: {verse['explanation']}")
-        else:
-            print("\n❌ No verse found")
+        def show(name, results):
+            # None means timed out / failed; iter_matches already printed why
+            if results is not None:
+                printers[name](results)
         
-        if story_results:
-            for i, (story, score, scaled_score) in enumerate(story_results, 1):
-                print(f"\n📚 MATCHING STORY #{i} (Score: {score:.4f}, Scaled: {scaled_score:.4f})")
-                print(f"   Key: {story['key']}")
-                print(f"   Title: {story.get('title', 'N/A')}")
-                print(f"   Text: {story.get('text', 'N/A')}")
-        else:
-            print("\n❌ No story found")
+        match_concurrently(phrase, corpora, on_result=show, temperature=TEMPERATURE, top_k=TOP_K,
+                           executor=executor, phrase_emb=phrase_emb)
         
         print("\n" + "=" * 60)
 
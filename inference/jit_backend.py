@@ -0,0 +1,130 @@
+"""
+TinyJit-compiled scoring for the tinygrad bi-encoder.
+
+Keys are encoded and realized once per key matrix; the query encode + score
+graph is captured by TinyJit for a few fixed batch sizes, and incoming query
+batches are zero-padded up to the nearest bucket. Plugs into
+find_best_verse/find_best_story through `score_all` like the backends in
+backends.py.
+
+Benchmark (eager vs. JIT per-query latency):
+    python inference/jit_backend.py
+"""
+import threading
+import time
+
+import numpy as np
+from tinygrad import Tensor, TinyJit
+
+BUCKET_SIZES = (1, 4, 16, 64)
+JIT_CAPTURE_CALLS = 3  # TinyJit records on the second call and replays from the third
+
+# tinygrad's scheduler and JIT capture are not thread-safe; every tinygrad call
+# made from worker threads (see infer.iter_matches) goes through this lock
+TINYGRAD_LOCK = threading.Lock()
+
+
+class TinyJitBiEncoder:
+    """Wraps a tinygrad KeyQueryModel with realized keys and JIT-compiled query scoring."""
+
+    def __init__(self, model, bucket_sizes=BUCKET_SIZES):
+        self.model = model
+        self.bucket_sizes = tuple(sorted(bucket_sizes))
+        # id(key_matrix) -> (key_matrix, {bucket: jitted fn})
+        self._compiled = {}
+
+    def _jits_for(self, key_matrix: np.ndarray) -> dict:
+        cached = self._compiled.get(id(key_matrix))
+        if cached is not None and cached[0] is key_matrix:
+            return cached[1]
+
+        keys_encoded = self.model.encode_key(Tensor(key_matrix)).realize()
+
+        def make_jit():
+            @TinyJit
+            def run(query: Tensor) -> Tensor:
+                return self.model.score(self.model.encode_query(query), keys_encoded).realize()
+            return run
+
+        # One JIT per bucket: captured graphs are only valid for a fixed input shape
+        jits = {bucket: make_jit() for bucket in self.bucket_sizes}
+        self._compiled[id(key_matrix)] = (key_matrix, jits)
+        return jits
+
+    def warmup(self, key_matrix: np.ndarray, input_dim: int = 1536):
+        """Realize keys and capture every bucket's graph so the first real query is fast."""
+        with TINYGRAD_LOCK:
+            jits = self._jits_for(key_matrix)
+            for bucket, run in jits.items():
+                dummy = np.zeros((bucket, input_dim), dtype=np.float32)
+                for _ in range(JIT_CAPTURE_CALLS):
+                    run(Tensor(dummy).realize()).numpy()
+
+    def _bucket(self, batch_size: int) -> int:
+        return next((b for b in self.bucket_sizes if b >= batch_size), self.bucket_sizes[-1])
+
+    def score_all(self, query_emb, key_matrix: np.ndarray) -> np.ndarray:
+        """Scores of one query (or a batch of queries) against every key row."""
+        queries = np.asarray(query_emb, dtype=np.float32)
+        single = queries.ndim == 1
+        if single:
+            queries = queries.reshape(1, -1)
+
+        outputs = []
+        max_bucket = self.bucket_sizes[-1]
+        with TINYGRAD_LOCK:
+            jits = self._jits_for(key_matrix)
+            for start in range(0, queries.shape[0], max_bucket):
+                block = queries[start:start + max_bucket]
+                bucket = self._bucket(block.shape[0])
+                padded = np.zeros((bucket, queries.shape[1]), dtype=np.float32)
+                padded[:block.shape[0]] = block
+                # .numpy() copies out of the JIT's reused output buffer
+                scores = jits[bucket](Tensor(padded).realize()).numpy().reshape(bucket, -1)
+                outputs.append(scores[:block.shape[0]])
+        scores = np.concatenate(outputs, axis=0)
+        return scores[0] if single else scores
+
+
+def benchmark(num_queries: int = 50):
+    """Print per-query latency of eager tinygrad scoring vs. the JIT path."""
+    from infer import (
+        VERSE_MODEL_PATH, STORY_MODEL_PATH, VerseModel, StoryModel,
+        load_model, load_verse_embeddings, load_story_embeddings, score_all_keys,
+    )
+
+    rng = np.random.default_rng(0)
+    corpora = (
+        ('verse', VERSE_MODEL_PATH, VerseModel, load_verse_embeddings()),
+        ('story', STORY_MODEL_PATH, StoryModel, load_story_embeddings()),
+    )
+    for corpus, checkpoint, model_class, embeddings in corpora:
+        model = load_model(checkpoint, model_class)
+        queries = rng.standard_normal((num_queries, embeddings.dimension)).astype(np.float32)
+
+        start = time.perf_counter()
+        eager = [score_all_keys(model, q, embeddings) for q in queries]
+        eager_ms = (time.perf_counter() - start) * 1000.0 / num_queries
+
+        jit_model = TinyJitBiEncoder(model)
+        start = time.perf_counter()
+        jit_model.warmup(embeddings.matrix, embeddings.dimension)
+        warmup_ms = (time.perf_counter() - start) * 1000.0
+
+        start = time.perf_counter()
+        jitted = [score_all_keys(jit_model, q, embeddings) for q in queries]
+        jit_ms = (time.perf_counter() - start) * 1000.0 / num_queries
+
+        start = time.perf_counter()
+        jit_model.score_all(queries, embeddings.matrix)
+        batched_ms = (time.perf_counter() - start) * 1000.0 / num_queries
+
+        max_diff = max(float(np.abs(a - b).max()) for a, b in zip(eager, jitted))
+        print(f"{corpus}: {len(embeddings)} keys, {num_queries} queries")
+        print(f"  eager      {eager_ms:8.3f} ms/query")
+        print(f"  jit        {jit_ms:8.3f} ms/query  (warm-up {warmup_ms:.0f} ms, max |diff| {max_diff:.2e})")
+        print(f"  jit batch  {batched_ms:8.3f} ms/query  (buckets {BUCKET_SIZES})")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,131 @@
+"""
+Tracks OpenAI API usage (tokens, cost, latency) for the enrichment scripts.
+Python counterpart of app/.../kotlinmodel/OpenAIUsageTracker.kt.
+
+Every request is appended as one compact JSON line to a local log; at the end
+of a run `write_summary` adds throughput, p50/p95 latency and tokens per verse.
+"""
+import json
+import time
+from pathlib import Path
+
+# Pricing per 1M tokens as (input, output), same estimates as the Android tracker
+MODEL_PRICING = {
+    "embedding-3-small": (0.02, 0.0),
+    "embedding-3-large": (0.13, 0.0),
+    "ada-002": (0.10, 0.0),
+    "gpt-5-nano": (0.10, 0.40),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4-turbo": (10.0, 30.0),
+    "gpt-4": (30.0, 60.0),
+    "gpt-3.5-turbo": (0.50, 1.50),
+}
+DEFAULT_PRICING = (0.02, 0.0)  # Default to small embedding model pricing
+
+
+def get_pricing(model: str):
+    """(input, output) USD per 1M tokens; first substring match wins, so order matters."""
+    model = model.lower()
+    for name, pricing in MODEL_PRICING.items():
+        if name in model:
+            return pricing
+    return DEFAULT_PRICING
+
+
+def _percentile(sorted_values, pct):
+    """Linear-interpolated percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    pos = (len(sorted_values) - 1) * pct / 100.0
+    lower = int(pos)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (pos - lower)
+
+
+class UsageTracker:
+    """Records per-request usage to a JSONL log and summarizes the run."""
+
+    def __init__(self, log_path: Path):
+        self.log_path = Path(log_path)
+        self.started_at = time.time()
+        self.records = []
+
+    def record(self, model, usage=None, latency_s=0.0, kind=None, item_id=None,
+               retries=0, fallback=False, error=None):
+        """Record one API request. `usage` is the `response.usage` object (or None on failure)."""
+        prompt_tokens = getattr(usage, "prompt_tokens", 0) or 0
+        completion_tokens = getattr(usage, "completion_tokens", 0) or 0
+        input_price, output_price = get_pricing(model)
+        entry = {
+            "ts": round(time.time(), 3),
+            "model": model,
+            "kind": kind,
+            "item": item_id,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "latency_ms": round(latency_s * 1000.0, 1),
+            "retries": retries,
+            "fallback": fallback,
+            "cost": round((prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000.0, 8),
+        }
+        if error is not None:
+            entry["error"] = str(error)[:200]
+        self.records.append(entry)
+        with open(self.log_path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False, separators=(",", ":")) + "\n")
+
+    def summary(self, items_processed=None) -> dict:
+        """Aggregate stats for the run so far."""
+        elapsed = max(time.time() - self.started_at, 1e-9)
+        # Failed attempts are logged separately and kept out of the latency percentiles
+        latencies = sorted(r["latency_ms"] for r in self.records if "error" not in r)
+        prompt_tokens = sum(r["prompt_tokens"] for r in self.records)
+        completion_tokens = sum(r["completion_tokens"] for r in self.records)
+
+        by_model = {}
+        for r in self.records:
+            m = by_model.setdefault(r["model"], {"requests": 0, "prompt_tokens": 0,
+                                                 "completion_tokens": 0, "cost": 0.0})
+            m["requests"] += 1
+            m["prompt_tokens"] += r["prompt_tokens"]
+            m["completion_tokens"] += r["completion_tokens"]
+            m["cost"] += r["cost"]
+
+        items = items_processed if items_processed else None
+        return {
+            "elapsed_s": round(elapsed, 2),
+            "requests": len(self.records),
+            "errors": sum(1 for r in self.records if "error" in r),
+            "retries": sum(r["retries"] for r in self.records),
+            "fallback_requests": sum(1 for r in self.records if r["fallback"]),
+            "requests_per_s": round(len(self.records) / elapsed, 3),
+            "items_processed": items_processed,
+            "items_per_min": round(items * 60.0 / elapsed, 2) if items else None,
+            "latency_ms_p50": round(_percentile(latencies, 50), 1),
+            "latency_ms_p95": round(_percentile(latencies, 95), 1),
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "tokens_per_item": round((prompt_tokens + completion_tokens) / items, 1) if items else None,
+            "total_cost": round(sum(r["cost"] for r in self.records), 6),
+            "by_model": by_model,
+        }
+
+    def write_summary(self, summary_path: Path, items_processed=None) -> dict:
+        """Write the run summary as JSON and print a short report."""
+        summary = self.summary(items_processed)
+        with open(summary_path, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+        print("\n" + "=" * 60)
+        print("OpenAI usage summary")
+        print("=" * 60)
+        print(f"  Requests: {summary['requests']} ({summary['errors']} errors, "
+              f"{summary['fallback_requests']} fallback, {summary['retries']} retries)")
+        print(f"  Throughput: {summary['requests_per_s']} req/s"
+              + (f", {summary['items_per_min']} verses/min" if summary['items_per_min'] else ""))
+        print(f"  Latency: p50 {summary['latency_ms_p50']} ms, p95 {summary['latency_ms_p95']} ms")
+        print(f"  Tokens: {summary['prompt_tokens']} prompt + {summary['completion_tokens']} completion"
+              + (f" ({summary['tokens_per_item']} per verse)" if summary['tokens_per_item'] else ""))
+        print(f"  Cost: ${summary['total_cost']:.6f}")
+        print(f"  Log: {self.log_path}  Summary: {summary_path}")
+        return summary
@@ -2,10 +2,16 @@ import json
 import os
 import sys
 from openai import OpenAI
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import time
+from openai_usage_tracker import UsageTracker
 
-def get_emotions_and_reflection(verse: Dict[str, Any], client: OpenAI) -> tuple[List[str], str]:
+MODEL = "gpt-4o-mini"
+USAGE_LOG_FILE = "emotions_usage.jsonl"
+USAGE_SUMMARY_FILE = "emotions_usage_summary.json"
+
+def get_emotions_and_reflection(verse: Dict[str, Any], client: OpenAI,
+                                tracker: Optional[UsageTracker] = None) -> tuple[List[str], str]:
     """
     Get 1-2 emotions and in-depth reflection for a verse using GPT-4o-mini
     """
@@ -27,15 +33,26 @@ Please respond in the following JSON format:
 If only one emotion is strongly present, provide only one emotion in the array."""
 
     try:
-        response = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "You are an expert in analyzing spiritual texts and identifying emotional themes. Provide thoughtful, insightful analysis."},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0.7,
-            response_format={"type": "json_object"}
-        )
+        request_start = time.perf_counter()
+        try:
+            response = client.chat.completions.create(
+                model=MODEL,
+                messages=[
+                    {"role": "system", "content": "You are an expert in analyzing spiritual texts and identifying emotional themes. Provide thoughtful, insightful analysis."},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0.7,
+                response_format={"type": "json_object"}
+            )
+        except Exception as e:
+            # Only the API call itself counts as a failed request
+            if tracker:
+                tracker.record(MODEL, latency_s=time.perf_counter() - request_start,
+                               kind="emotions_reflection", item_id=verse['id'], error=e)
+            raise
+        if tracker:
+            tracker.record(MODEL, response.usage, time.perf_counter() - request_start,
+                           kind="emotions_reflection", item_id=verse['id'])
         
         result = json.loads(response.choices[0].message.content)
         emotions = result.get("emotions", [])
@@ -45,10 +62,11 @@ If only one emotion is strongly present, provide only one emotion in the array."
     
     except Exception as e:
         print(f"Error processing verse {verse['id']}: {e}")
-        # Return defaults if API call fails
+        # Return defaults if API call or parsing fails
         return ["Uncertainty"], "An error occurred while generating reflection for this verse."
 
-def update_verses(input_file: str, output_file: str, client: OpenAI, num_verses: int = 100):
+def update_verses(input_file: str, output_file: str, client: OpenAI, num_verses: int = 100,
+                  tracker: Optional[UsageTracker] = None):
     """
     Update the first N verses with new emotions and reflections
     """
@@ -66,7 +84,7 @@ def update_verses(input_file: str, output_file: str, client: OpenAI, num_verses:
         print(f"\nProcessing verse {i}/{num_verses}: {verse['id']}")
         
         # Get emotions and reflection from OpenAI
-        emotions, reflection = get_emotions_and_reflection(verse, client)
+        emotions, reflection = get_emotions_and_reflection(verse, client, tracker)
         
         # Update the verse
         verse['emotions'] = emotions
@@ -85,6 +103,9 @@ def update_verses(input_file: str, output_file: str, client: OpenAI, num_verses:
         json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
     
     print("Done!")
+    
+    if tracker:
+        tracker.write_summary(USAGE_SUMMARY_FILE, items_processed=min(num_verses, len(data)))
 
 if __name__ == "__main__":
     input_file = "app/src/main/java/com/gita/app/data/enriched_gita_formatted.json"
@@ -107,5 +128,6 @@ if __name__ == "__main__":
     # Initialize OpenAI client
     client = OpenAI(api_key=api_key)
     
-    update_verses(input_file, output_file, client, num_verses=100)
+    tracker = UsageTracker(USAGE_LOG_FILE)
+    update_verses(input_file, output_file, client, num_verses=100, tracker=tracker)
 